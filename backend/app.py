@@ -1,25 +1,554 @@
-from flask import Flask, request, jsonify
-from flask_cors import CORS
+from quart import Quart, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
 import os
+import asyncio
 from dotenv import load_dotenv
-import openai
+import httpx
+import ijson
+from openai import AsyncOpenAI
 import boto3
-import json
+from botocore.config import Config
+import jsonx
+import hashlib
 import logging
-
-# 加載環境變量
+import pickle
+import re
+import threading
+import time
+import weakref
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import lru_cache
+from cachetools import LRUCache, TTLCache
+from cachetools.keys import hashkey
+from diskcache import Cache
+
+# 加載環境變量 (啟動後不再變化，讀取一次保存為常量)
 load_dotenv()
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+BACKEND_PORT = int(os.getenv('BACKEND_PORT', 3001))
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 初始化Flask應用
-app = Flask(__name__)
-CORS(app)  # 允許跨域請求
 
-# 設置API密鑰
-openai.api_key = os.getenv("OPENAI_API_KEY")
+class ORJSONProvider(DefaultJSONProvider):
+    """基於orjson的JSON序列化，直接輸出UTF-8，不把中文轉義為\\uXXXX"""
+
+    def dumps(self, obj, **kwargs):
+        return jsonx.dumps(obj)
+
+    def loads(self, s, **kwargs):
+        return jsonx.loads(s)
+
+
+# 初始化Quart應用 (ASGI，等待OpenAI回應時不佔用worker)
+app = Quart(__name__)
+app.json = ORJSONProvider(app)
+app = cors(app)  # 允許跨域請求
+
+# 共用的異步OpenAI客戶端，所有請求復用同一個連接池
+openai_client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100))
+)
+
+
+# 價格查詢結果緩存 (標價最多每天變動一次，緩存一小時)，鍵為規範化後的查詢參數
+# 只保存解析後的精簡記錄，按記錄總數限制大小 (僅在事件循環中訪問，無需加鎖)
+# 空結果也計為一條記錄，否則大量無結果的查詢會使條目數不受限制地增長
+RESULT_CACHE_MAX_ROWS = 50000
+_RESULT_CACHE = TTLCache(maxsize=RESULT_CACHE_MAX_ROWS, ttl=3600,
+                         getsizeof=lambda rows: max(1, len(rows)))
+
+# 緩存鍵中忽略大小寫的參數
+_CASE_INSENSITIVE_PARAMS = frozenset(('service', 'region', 'os'))
+
+# 生成自然語言回應的最大token數
+RESPONSE_MAX_TOKENS = 400
+
+# 參數提取只是填充函數參數，使用較小較快的模型；生成回應使用較大的模型
+# (兩者均支持提示詞前綴緩存)
+EXTRACT_MODEL = "gpt-4o-mini"
+RESPONSE_MODEL = "gpt-4o"
+
+# 系統提示詞和範例固定不變且放在消息最前面，超過1024個token後可命中OpenAI的提示詞緩存
+_EXTRACT_SYSTEM_PROMPT = """你是一個專門解析AWS價格查詢的助手。提取關鍵參數如服務類型、地區、實例類型等。
+
+規則:
+1. service 使用服務英文名稱: EC2、S3、RDS、Lambda、DynamoDB。
+2. region 優先使用地區代碼，如 us-east-1、ap-northeast-1；用戶只提到城市時使用中文城市名稱，如東京、新加坡、法蘭克福。
+3. instance_type 保留用戶輸入的實例類型，如 t3.micro、m5.large、db.r5.xlarge；RDS實例類型必須帶 db. 前綴。
+4. os 只在EC2查詢中提供，使用 Linux、Windows、RHEL、SUSE 等名稱；未提及時不要猜測。
+5. storage_class 只在S3查詢中提供；storage_size 保留數字和單位，如 100GB、2TB。
+6. db_engine 只在RDS查詢中提供，使用 MySQL、PostgreSQL、MariaDB、Oracle、SQL Server、Aurora MySQL、Aurora PostgreSQL。
+7. 用戶沒有提到的參數一律省略，不要填入默認值。
+
+範例:
+查詢: 東京的t3.micro Linux實例每小時多少錢？
+參數: {"service": "EC2", "region": "東京", "instance_type": "t3.micro", "os": "Linux"}
+
+查詢: us-east-1 跑一台 m5.large Windows 要多少
+參數: {"service": "EC2", "region": "us-east-1", "instance_type": "m5.large", "os": "Windows"}
+
+查詢: What is the price of c6g.xlarge in eu-west-1?
+參數: {"service": "EC2", "region": "eu-west-1", "instance_type": "c6g.xlarge"}
+
+查詢: 新加坡的r6i.2xlarge紅帽系統價格
+參數: {"service": "EC2", "region": "新加坡", "instance_type": "r6i.2xlarge", "os": "RHEL"}
+
+查詢: S3標準儲存在東京存100GB一個月多少錢
+參數: {"service": "S3", "region": "東京", "storage_class": "Standard", "storage_size": "100GB"}
+
+查詢: ap-southeast-1 的 S3 Glacier Deep Archive 存 5TB 的費用
+參數: {"service": "S3", "region": "ap-southeast-1", "storage_class": "Glacier Deep Archive", "storage_size": "5TB"}
+
+查詢: S3智能分層在法蘭克福的價格
+參數: {"service": "S3", "region": "法蘭克福", "storage_class": "Intelligent-Tiering"}
+
+查詢: 東京 RDS MySQL db.t3.medium 每小時價格
+參數: {"service": "RDS", "region": "東京", "instance_type": "db.t3.medium", "db_engine": "MySQL"}
+
+查詢: How much is Aurora PostgreSQL db.r6g.large in us-west-2?
+參數: {"service": "RDS", "region": "us-west-2", "instance_type": "db.r6g.large", "db_engine": "Aurora PostgreSQL"}
+
+查詢: 首爾的RDS SQL Server m5.xlarge
+參數: {"service": "RDS", "region": "首爾", "instance_type": "db.m5.xlarge", "db_engine": "SQL Server"}
+
+查詢: Lambda在us-east-1的請求和運行時間怎麼收費
+參數: {"service": "Lambda", "region": "us-east-1"}
+
+查詢: 東京 DynamoDB 的讀寫單位價格
+參數: {"service": "DynamoDB", "region": "東京"}
+
+查詢: EC2 t2.micro 多少錢
+參數: {"service": "EC2", "instance_type": "t2.micro"}
+"""
+
+_RESPONSE_SYSTEM_PROMPT = """你是一個AWS成本專家，提供準確的價格信息和建議。
+
+用戶消息包含用戶查詢和價格數據。價格數據是JSON，cols 為欄位名稱，rows 為每個價格項目，欄位順序與 cols 一致。
+
+回答要求:
+1. 請提供簡潔明了的回應，包含用戶請求的價格信息。
+2. 只使用價格數據中出現的數字，不要自行估算或編造價格；需要換算時寫出計算方式。
+3. 價格以美元表示並保留原始精度，同時註明計價單位，如每小時、每GB每月、每百萬請求。
+4. 有多個價格項目時，先列出最符合查詢的一項，再簡要列出其他選項。
+5. EC2和RDS按需價格可以附帶每月估算 (按730小時計算)。
+6. 使用與用戶查詢相同的語言回答；中文查詢使用繁體中文。
+7. 不要重複輸出原始JSON。
+
+範例:
+用戶查詢: '東京的t3.micro Linux實例每小時多少錢？'
+價格數據: {"cols": ["instanceType", "operatingSystem", "region", "onDemandPrice", "unit"], "rows": [["t3.micro", "Linux", "Asia Pacific (Tokyo)", "0.0136", "USD per Hour"]]}
+回應: 東京地區 (ap-northeast-1) 的 t3.micro Linux 按需實例價格為每小時 0.0136 美元，按每月730小時計算約 9.93 美元。
+
+用戶查詢: 'S3標準儲存在東京存100GB一個月多少錢'
+價格數據: {"cols": ["storageClass", "volumeType", "region", "price", "description", "unit"], "rows": [["General Purpose", "Standard", "Asia Pacific (Tokyo)", "0.0250000000", "$0.025 per GB - first 50 TB / month of storage used", "GB-Mo"]]}
+回應: 東京地區 S3 標準儲存前 50 TB 的價格為每 GB 每月 0.025 美元，100GB 每月約 100 × 0.025 = 2.5 美元 (不含請求和數據傳輸費用)。
+
+用戶查詢: 'How much is RDS MySQL db.t3.medium in us-east-1?'
+價格數據: {"cols": ["databaseEngine", "instanceType", "deploymentOption", "region", "price", "description", "unit"], "rows": [["MySQL", "db.t3.medium", "Single-AZ", "US East (N. Virginia)", "0.0680000000", "$0.068 per On Demand MySQL db.t3.medium Instance Hour", "Hrs"]]}
+回應: In US East (N. Virginia), an on-demand Single-AZ db.t3.medium running MySQL costs $0.068 per hour, or about $49.64 per month at 730 hours.
+
+用戶查詢: 'Lambda在us-east-1怎麼收費'
+價格數據: {"cols": ["group", "region", "price", "description", "unit"], "rows": [["AWS-Lambda-Requests", "US East (N. Virginia)", "0.0000002000", "AWS Lambda - Total Requests - US East (Northern Virginia)", "Requests"], ["AWS-Lambda-Duration", "US East (N. Virginia)", "0.0000166667", "AWS Lambda - Total Compute - US East (Northern Virginia)", "Lambda-GB-Second"]]}
+回應: us-east-1 的 Lambda 按兩部分收費：請求費用為每次 0.0000002 美元 (即每百萬次請求 0.2 美元)；運行時間費用為每 GB-秒 0.0000166667 美元。例如 512MB 內存的函數運行 1 秒，費用約為 0.5 × 0.0000166667 ≈ 0.0000083 美元。
+"""
+
+# 參數提取使用的函數定義
+_EXTRACT_PARAMETERS = {
+    "type": "object",
+    "properties": {
+        "service": {
+            "type": "string",
+            "description": "AWS服務類型，如EC2、S3、RDS、Lambda、DynamoDB等"
+        },
+        "region": {
+            "type": "string",
+            "description": "AWS區域，如us-east-1、ap-northeast-1(東京)等"
+        },
+        "instance_type": {
+            "type": "string",
+            "description": "EC2或RDS實例類型，如t2.micro、m5.large等"
+        },
+        "os": {
+            "type": "string",
+            "description": "EC2操作系統，如Linux、Windows等"
+        },
+        "storage_class": {
+            "type": "string",
+            "description": "S3儲存類型，如Standard(標準)、Intelligent-Tiering(智能分層)、Glacier(冷藏)等"
+        },
+        "storage_size": {
+            "type": "string",
+            "description": "儲存大小，如100GB、1TB等"
+        },
+        "db_engine": {
+            "type": "string",
+            "description": "RDS數據庫引擎，如MySQL、PostgreSQL、Oracle、SQL Server等"
+        }
+    },
+    "required": ["service"]
+}
+_EXTRACT_FUNCTIONS = [{
+    "name": "get_aws_price",
+    "description": "獲取AWS服務的價格信息",
+    "parameters": _EXTRACT_PARAMETERS
+}]
+
+# 一次提取多個查詢的參數，每個結果帶回查詢在數組中的位置，用於核對後再分發
+_EXTRACT_BATCH_ITEM = {
+    **_EXTRACT_PARAMETERS,
+    "properties": {
+        "index": {
+            "type": "integer",
+            "description": "該結果對應的查詢在查詢數組中的位置 (從0開始)"
+        },
+        **_EXTRACT_PARAMETERS["properties"]
+    },
+    "required": ["index", *_EXTRACT_PARAMETERS["required"]]
+}
+_EXTRACT_BATCH_FUNCTIONS = [{
+    "name": "get_aws_prices",
+    "description": "獲取多個AWS價格查詢的價格信息",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "results": {
+                "type": "array",
+                "description": "每個查詢的參數，每個查詢一個結果",
+                "items": _EXTRACT_BATCH_ITEM
+            }
+        },
+        "required": ["results"]
+    }
+}]
+
+# 參數提取配置 (模型、提示詞、函數定義) 的指紋，作為磁盤緩存鍵的一部分，
+# 配置變更後舊配置提取的結果不會再被命中
+_EXTRACT_VERSION = hashlib.sha256(jsonx.dumps(
+    [EXTRACT_MODEL, _EXTRACT_SYSTEM_PROMPT, _EXTRACT_FUNCTIONS]).encode()).hexdigest()
+
+# 每次查詢最多獲取的產品數量 (get_products每頁最多100個)
+MAX_PRICE_ITEMS = 500
+
+# 批量查詢每次最多提交的查詢數量 (參數提取和價格查詢仍即時完成)
+MAX_BULK_QUERIES = 100
+
+# 儲存大小解析 (如100GB、1TB)，以及各單位換算為GB的倍數
+_SIZE_RE = re.compile(r'(\d+)\s*([a-zA-Z]+)?')
+_SIZE_UNIT_TO_GB = {'TB': 1024.0, 'GB': 1.0, 'MB': 1 / 1024.0}
+
+# EC2查詢固定使用的過濾器 (只查詢共享租用的計算實例)
+EC2_STATIC_FILTERS = (
+    {'Type': 'TERM_MATCH', 'Field': 'productFamily', 'Value': 'Compute Instance'},
+    {'Type': 'TERM_MATCH', 'Field': 'tenancy', 'Value': 'Shared'},
+)
+
+# 區域代碼到AWS Price List API位置名稱的映射
+REGION_MAPPING = {
+    'us-east-1': 'US East (N. Virginia)',
+    'us-east-2': 'US East (Ohio)',
+    'us-west-1': 'US West (N. California)',
+    'us-west-2': 'US West (Oregon)',
+    'us-gov-east-1': 'AWS GovCloud (US-East)',
+    'us-gov-west-1': 'AWS GovCloud (US-West)',
+    'af-south-1': 'Africa (Cape Town)',
+    'ap-east-1': 'Asia Pacific (Hong Kong)',
+    'ap-east-2': 'Asia Pacific (Taipei)',
+    'ap-south-1': 'Asia Pacific (Mumbai)',
+    'ap-south-2': 'Asia Pacific (Hyderabad)',
+    'ap-northeast-1': 'Asia Pacific (Tokyo)',
+    'ap-northeast-2': 'Asia Pacific (Seoul)',
+    'ap-northeast-3': 'Asia Pacific (Osaka)',
+    'ap-southeast-1': 'Asia Pacific (Singapore)',
+    'ap-southeast-2': 'Asia Pacific (Sydney)',
+    'ap-southeast-3': 'Asia Pacific (Jakarta)',
+    'ap-southeast-4': 'Asia Pacific (Melbourne)',
+    'ap-southeast-5': 'Asia Pacific (Malaysia)',
+    'ap-southeast-7': 'Asia Pacific (Thailand)',
+    'ca-central-1': 'Canada (Central)',
+    'ca-west-1': 'Canada West (Calgary)',
+    'eu-central-1': 'EU (Frankfurt)',
+    'eu-central-2': 'EU (Zurich)',
+    'eu-west-1': 'EU (Ireland)',
+    'eu-west-2': 'EU (London)',
+    'eu-west-3': 'EU (Paris)',
+    'eu-south-1': 'EU (Milan)',
+    'eu-south-2': 'EU (Spain)',
+    'eu-north-1': 'EU (Stockholm)',
+    'il-central-1': 'Israel (Tel Aviv)',
+    'me-south-1': 'Middle East (Bahrain)',
+    'me-central-1': 'Middle East (UAE)',
+    'mx-central-1': 'Mexico (Central)',
+    'sa-east-1': 'South America (Sao Paulo)',
+}
+
+# 價格API地區名稱 (小寫) 到標準寫法的映射，用於接受直接輸入的地區名稱
+_LOCATION_NAMES = {name.lower(): name for name in REGION_MAPPING.values()}
+_LOCATION_TO_REGION = {name: code for code, name in REGION_MAPPING.items()}
+
+# AWS地區代碼格式，如 us-east-1、ap-northeast-1、us-gov-west-1
+_REGION_RE = re.compile(r'^[a-z]{2}(?:-gov)?-[a-z]+-\d+$')
+
+
+def _compile_rules(rules):
+    """將(關鍵詞, 標準值)規則表編譯為單個正則表達式，匹配時只需掃描輸入一次
+
+    規則表的順序即優先級，多個關鍵詞同時出現時取排在最前的規則
+    """
+    keywords = sorted((keyword for keyword, _ in rules), key=len, reverse=True)
+    pattern = re.compile('|'.join(re.escape(keyword) for keyword in keywords))
+    priority = {keyword: (i, value) for i, (keyword, value) in enumerate(rules)}
+    return pattern, priority
+
+
+def _match_rule(rules, text, default):
+    """返回text中出現的優先級最高的關鍵詞所對應的標準值"""
+    pattern, priority = rules
+    matches = [priority[keyword] for keyword in pattern.findall(text)]
+    return min(matches)[1] if matches else default
+
+
+# 用戶輸入關鍵詞到標準值的映射，按順序匹配 (更具體的關鍵詞在前)
+_REGION_ALIAS_RULES = _compile_rules((
+    ('維吉尼亞', 'us-east-1'),
+    ('弗吉尼亚', 'us-east-1'),
+    ('维吉尼亚', 'us-east-1'),
+    ('virginia', 'us-east-1'),
+    ('俄亥俄', 'us-east-2'),
+    ('ohio', 'us-east-2'),
+    ('加州', 'us-west-1'),
+    ('加利福尼亞', 'us-west-1'),
+    ('加利福尼亚', 'us-west-1'),
+    ('california', 'us-west-1'),
+    ('俄勒岡', 'us-west-2'),
+    ('奧勒岡', 'us-west-2'),
+    ('俄勒冈', 'us-west-2'),
+    ('oregon', 'us-west-2'),
+    ('開普敦', 'af-south-1'),
+    ('开普敦', 'af-south-1'),
+    ('cape town', 'af-south-1'),
+    ('香港', 'ap-east-1'),
+    ('hong kong', 'ap-east-1'),
+    ('hongkong', 'ap-east-1'),
+    ('台北', 'ap-east-2'),
+    ('臺北', 'ap-east-2'),
+    ('taipei', 'ap-east-2'),
+    ('孟買', 'ap-south-1'),
+    ('孟买', 'ap-south-1'),
+    ('mumbai', 'ap-south-1'),
+    ('海德拉巴', 'ap-south-2'),
+    ('海得拉巴', 'ap-south-2'),
+    ('hyderabad', 'ap-south-2'),
+    ('東京', 'ap-northeast-1'),
+    ('东京', 'ap-northeast-1'),
+    ('tokyo', 'ap-northeast-1'),
+    ('首爾', 'ap-northeast-2'),
+    ('首尔', 'ap-northeast-2'),
+    ('seoul', 'ap-northeast-2'),
+    ('大阪', 'ap-northeast-3'),
+    ('osaka', 'ap-northeast-3'),
+    ('新加坡', 'ap-southeast-1'),
+    ('singapore', 'ap-southeast-1'),
+    ('雪梨', 'ap-southeast-2'),
+    ('悉尼', 'ap-southeast-2'),
+    ('sydney', 'ap-southeast-2'),
+    ('雅加達', 'ap-southeast-3'),
+    ('雅加达', 'ap-southeast-3'),
+    ('jakarta', 'ap-southeast-3'),
+    ('墨爾本', 'ap-southeast-4'),
+    ('墨尔本', 'ap-southeast-4'),
+    ('melbourne', 'ap-southeast-4'),
+    ('馬來西亞', 'ap-southeast-5'),
+    ('马来西亚', 'ap-southeast-5'),
+    ('吉隆坡', 'ap-southeast-5'),
+    ('malaysia', 'ap-southeast-5'),
+    ('kuala lumpur', 'ap-southeast-5'),
+    ('泰國', 'ap-southeast-7'),
+    ('泰国', 'ap-southeast-7'),
+    ('曼谷', 'ap-southeast-7'),
+    ('thailand', 'ap-southeast-7'),
+    ('bangkok', 'ap-southeast-7'),
+    ('加拿大西部', 'ca-west-1'),
+    ('卡加利', 'ca-west-1'),
+    ('卡爾加里', 'ca-west-1'),
+    ('卡尔加里', 'ca-west-1'),
+    ('calgary', 'ca-west-1'),
+    ('加拿大', 'ca-central-1'),
+    ('蒙特婁', 'ca-central-1'),
+    ('蒙特利爾', 'ca-central-1'),
+    ('蒙特利尔', 'ca-central-1'),
+    ('montreal', 'ca-central-1'),
+    ('法蘭克福', 'eu-central-1'),
+    ('法兰克福', 'eu-central-1'),
+    ('frankfurt', 'eu-central-1'),
+    ('蘇黎世', 'eu-central-2'),
+    ('苏黎世', 'eu-central-2'),
+    ('zurich', 'eu-central-2'),
+    ('愛爾蘭', 'eu-west-1'),
+    ('爱尔兰', 'eu-west-1'),
+    ('ireland', 'eu-west-1'),
+    ('倫敦', 'eu-west-2'),
+    ('伦敦', 'eu-west-2'),
+    ('london', 'eu-west-2'),
+    ('巴黎', 'eu-west-3'),
+    ('paris', 'eu-west-3'),
+    ('米蘭', 'eu-south-1'),
+    ('米兰', 'eu-south-1'),
+    ('milan', 'eu-south-1'),
+    ('西班牙', 'eu-south-2'),
+    ('spain', 'eu-south-2'),
+    ('斯德哥爾摩', 'eu-north-1'),
+    ('斯德哥尔摩', 'eu-north-1'),
+    ('stockholm', 'eu-north-1'),
+    ('以色列', 'il-central-1'),
+    ('特拉維夫', 'il-central-1'),
+    ('特拉维夫', 'il-central-1'),
+    ('israel', 'il-central-1'),
+    ('tel aviv', 'il-central-1'),
+    ('巴林', 'me-south-1'),
+    ('bahrain', 'me-south-1'),
+    ('阿聯酋', 'me-central-1'),
+    ('阿联酋', 'me-central-1'),
+    ('阿拉伯聯合大公國', 'me-central-1'),
+    ('阿拉伯联合酋长国', 'me-central-1'),
+    ('杜拜', 'me-central-1'),
+    ('迪拜', 'me-central-1'),
+    ('dubai', 'me-central-1'),
+    ('uae', 'me-central-1'),
+    ('emirates', 'me-central-1'),
+    ('墨西哥', 'mx-central-1'),
+    ('mexico', 'mx-central-1'),
+    ('聖保羅', 'sa-east-1'),
+    ('圣保罗', 'sa-east-1'),
+    ('sao paulo', 'sa-east-1'),
+    ('são paulo', 'sa-east-1'),
+    # 國家和大區名稱排在城市之後，與城市同時出現時以城市為準
+    ('美國東部', 'us-east-1'),
+    ('美国东部', 'us-east-1'),
+    ('us east', 'us-east-1'),
+    ('美國西部', 'us-west-2'),
+    ('美国西部', 'us-west-2'),
+    ('us west', 'us-west-2'),
+    ('美國', 'us-east-1'),
+    ('美国', 'us-east-1'),
+    ('united states', 'us-east-1'),
+    ('南非', 'af-south-1'),
+    ('south africa', 'af-south-1'),
+    ('台灣', 'ap-east-2'),
+    ('臺灣', 'ap-east-2'),
+    ('台湾', 'ap-east-2'),
+    ('taiwan', 'ap-east-2'),
+    ('印度尼西亞', 'ap-southeast-3'),
+    ('印度尼西亚', 'ap-southeast-3'),
+    ('印尼', 'ap-southeast-3'),
+    ('indonesia', 'ap-southeast-3'),
+    ('印度', 'ap-south-1'),
+    ('india', 'ap-south-1'),
+    ('日本', 'ap-northeast-1'),
+    ('japan', 'ap-northeast-1'),
+    ('韓國', 'ap-northeast-2'),
+    ('韩国', 'ap-northeast-2'),
+    ('南韓', 'ap-northeast-2'),
+    ('南韩', 'ap-northeast-2'),
+    ('korea', 'ap-northeast-2'),
+    ('澳洲', 'ap-southeast-2'),
+    ('澳大利亞', 'ap-southeast-2'),
+    ('澳大利亚', 'ap-southeast-2'),
+    ('australia', 'ap-southeast-2'),
+    ('德國', 'eu-central-1'),
+    ('德国', 'eu-central-1'),
+    ('germany', 'eu-central-1'),
+    ('瑞士', 'eu-central-2'),
+    ('switzerland', 'eu-central-2'),
+    ('英國', 'eu-west-2'),
+    ('英国', 'eu-west-2'),
+    ('united kingdom', 'eu-west-2'),
+    ('england', 'eu-west-2'),
+    ('法國', 'eu-west-3'),
+    ('法国', 'eu-west-3'),
+    ('france', 'eu-west-3'),
+    ('義大利', 'eu-south-1'),
+    ('意大利', 'eu-south-1'),
+    ('italy', 'eu-south-1'),
+    ('瑞典', 'eu-north-1'),
+    ('sweden', 'eu-north-1'),
+    ('巴西', 'sa-east-1'),
+    ('brazil', 'sa-east-1'),
+))
+_OS_RULES = _compile_rules((
+    ('linux', 'Linux'),
+    ('windows', 'Windows'),
+))
+_S3_RULES = _compile_rules((
+    ('單區域', 'One Zone'),
+    ('one zone', 'One Zone'),
+    ('標準-不頻繁', 'Standard - Infrequent Access'),
+    ('infrequent', 'Standard - Infrequent Access'),
+    ('深度', 'Glacier Deep Archive'),
+    ('deep', 'Glacier Deep Archive'),
+    ('冷藏', 'Glacier'),
+    ('glacier', 'Glacier'),
+    ('智能', 'Intelligent-Tiering'),
+    ('intelligent', 'Intelligent-Tiering'),
+    ('標準', 'Standard'),
+    ('standard', 'Standard'),
+))
+_DB_RULES = _compile_rules((
+    ('mysql', 'MySQL'),
+    ('postgres', 'PostgreSQL'),
+    ('oracle', 'Oracle'),
+    ('sqlserver', 'SQL Server'),
+    ('sql server', 'SQL Server'),
+    ('mariadb', 'MariaDB'),
+))
+
+# EC2價格索引，從AWS價格清單文件構建，啟用後在後台按地區加載
+# 結構為 {地區名稱: {(實例類型, 操作系統, 租用方式): [價格記錄]}}
+OFFER_URL = "https://pricing.us-east-1.amazonaws.com/offers/v1.0/aws/AmazonEC2/current/{region}/index.json"
+PRICE_INDEX_ENABLED = os.getenv('EC2_PRICE_INDEX', 'false').lower() == 'true'
+PRICE_INDEX_DIR = os.getenv('EC2_PRICE_INDEX_DIR', '/tmp/aws-price-index')
+# 啟動時預加載的地區代碼，其他地區在首次查詢時加載
+PRICE_INDEX_REGIONS = [
+    region.strip()
+    for region in os.getenv('EC2_PRICE_INDEX_REGIONS', '').split(',')
+    if region.strip() in REGION_MAPPING
+]
+PRICE_INDEX_REFRESH = 86400  # 秒
+PRICE_INDEX_TIMEOUT = 300.0  # 價格清單文件較大 (數百MB)，下載超時設長一些
+PRICE_INDEX_RETRY = 3600  # 構建失敗後至少間隔多久 (秒) 才重試，每日刷新時也會重試
+_PRICE_INDEX = {}
+_PRICE_INDEX_LOADING = set()
+_PRICE_INDEX_FAILED = {}  # 地區代碼 -> 最近一次構建失敗的時間 (time.monotonic)
+_PRICE_INDEX_LOCK = threading.Lock()
+
+# 查詢參數提取結果緩存，鍵為規範化後的查詢字符串
+_PARAMS_CACHE = LRUCache(maxsize=4096)
+# 參數提取結果的磁盤緩存 (進程重啟和多個worker之間共享)，保存一天
+_QUERY_CACHE = Cache(
+    os.getenv('QUERY_CACHE_DIR', '/tmp/aws-price-cache'), size_limit=2**30)
+QUERY_CACHE_EXPIRE = 86400
+# 批量查詢中沒有價格數據的查詢不提交給Batch API，其固定回應和查詢總數保存在磁盤緩存中
+# (供任意worker查詢批次結果時合併)，保存時間長於Batch API的24小時完成窗口
+BULK_RESULTS_EXPIRE = 7 * 86400
+# Batch API中不會再變化的批次狀態
+BATCH_TERMINAL_STATUSES = frozenset(('completed', 'failed', 'expired', 'cancelled'))
+
+# 參數提取請求合併：在時間窗口內到達的查詢合併為一次OpenAI調用
+EXTRACT_BATCH_SIZE = 8
+EXTRACT_BATCH_WINDOW = 0.02  # 秒
+EXTRACT_TIMEOUT = 60.0  # 等待合併提取結果的最長時間 (秒)
+# 每個事件循環各自的合併隊列 (隊列和收集任務只能在創建它們的事件循環中使用)
+_EXTRACT_QUEUES = weakref.WeakKeyDictionary()
+_EXTRACT_TASKS = set()
 
 
 def create_aws_client():
@@ -27,145 +556,449 @@ def create_aws_client():
     return boto3.client(
         'pricing',
         region_name='us-east-1',  # Price List API 僅在us-east-1和ap-south-1可用
-        aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-        aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY')
+        aws_access_key_id=AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+        config=Config(
+            max_pool_connections=50,
+            retries={'max_attempts': 3, 'mode': 'adaptive'}
+        )
     )
 
 
-def extract_parameters_with_openai(query):
+def _decode_price_list(parsed, **kwargs):
+    """botocore回調：將GetProducts回應中的PriceList字符串一次性解碼為字典"""
+    price_list = parsed.get('PriceList')
+    if price_list:
+        loads = jsonx.loads
+        parsed['PriceList'] = [loads(product_str) for product_str in price_list]
+
+
+# Pricing API調用專用的線程池，限制並發以免觸發API限流，也不佔用默認線程池
+PRICING_EXECUTOR = ThreadPoolExecutor(
+    max_workers=8, thread_name_prefix='pricing')
+
+# 全局共用的價格API客戶端，避免每次請求重新加載服務模型和解析憑證
+# (boto3客戶端可安全地在多個線程間共用)，首次使用時才創建
+_PRICING_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_aws_client():
+    """獲取全局共用的AWS Price List API客戶端"""
+    global _PRICING_CLIENT
+    if _PRICING_CLIENT is None:
+        with _CLIENT_LOCK:
+            if _PRICING_CLIENT is None:
+                client = create_aws_client()
+                client.meta.events.register(
+                    'after-call.pricing.GetProducts', _decode_price_list)
+                _PRICING_CLIENT = client
+    return _PRICING_CLIENT
+
+
+async def extract_parameters_with_openai(query):
     """使用OpenAI API提取查詢參數"""
-    logger.info(f"從查詢中提取參數: {query}")
+    logger.info("從查詢中提取參數: %s", query)
 
-    try:
-        # 使用OpenAI函數調用功能提取參數
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo-0125",
-            messages=[
-                {"role": "system", "content": "你是一個專門解析AWS價格查詢的助手。提取關鍵參數如服務類型、地區、實例類型等。"},
-                {"role": "user", "content": query}
-            ],
-            functions=[{
-                "name": "get_aws_price",
-                "description": "獲取AWS服務的價格信息",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "service": {
-                            "type": "string",
-                            "description": "AWS服務類型，如EC2、S3、RDS、Lambda、DynamoDB等"
-                        },
-                        "region": {
-                            "type": "string",
-                            "description": "AWS區域，如us-east-1、ap-northeast-1(東京)等"
-                        },
-                        "instance_type": {
-                            "type": "string",
-                            "description": "EC2或RDS實例類型，如t2.micro、m5.large等"
-                        },
-                        "os": {
-                            "type": "string",
-                            "description": "EC2操作系統，如Linux、Windows等"
-                        },
-                        "storage_class": {
-                            "type": "string",
-                            "description": "S3儲存類型，如Standard(標準)、Intelligent-Tiering(智能分層)、Glacier(冷藏)等"
-                        },
-                        "storage_size": {
-                            "type": "string",
-                            "description": "儲存大小，如100GB、1TB等"
-                        },
-                        "db_engine": {
-                            "type": "string",
-                            "description": "RDS數據庫引擎，如MySQL、PostgreSQL、Oracle、SQL Server等"
-                        }
-                    },
-                    "required": ["service"]
-                }
-            }],
-            function_call={"name": "get_aws_price"}
-        )
+    cache_key = query.strip().lower()
+    if cache_key in _PARAMS_CACHE:
+        return dict(_PARAMS_CACHE[cache_key])
 
-        # 從回應中提取函數參數
-        function_args = json.loads(
-            response.choices[0].message.function_call.arguments)
-        return function_args
+    disk_key = hashlib.sha256(
+        f"{_EXTRACT_VERSION}:{cache_key}".encode()).hexdigest()
+    function_args = _QUERY_CACHE.get(disk_key)
+    if function_args is not None:
+        _PARAMS_CACHE[cache_key] = function_args
+        return dict(function_args)
 
+    try:
+        # 交給合併隊列，與同時到達的其他查詢一起提取
+        loop = asyncio.get_running_loop()
+        queue = _EXTRACT_QUEUES.get(loop)
+        if queue is None:
+            queue = _EXTRACT_QUEUES[loop] = asyncio.Queue()
+            _start_task(_extract_batch_worker(queue))
+
+        future = loop.create_future()
+        await queue.put((query, future))
+        function_args = await asyncio.wait_for(future, EXTRACT_TIMEOUT)
+
+        _PARAMS_CACHE[cache_key] = function_args
+        _QUERY_CACHE.set(disk_key, function_args, expire=QUERY_CACHE_EXPIRE)
+        return dict(function_args)
+
+    except asyncio.TimeoutError:
+        logger.error("提取參數超時: %s", query)
+        return {"error": f"提取參數超時 ({EXTRACT_TIMEOUT:g}秒)"}
     except Exception as e:
-        logger.error(f"OpenAI API調用錯誤: {str(e)}")
+        logger.error("OpenAI API調用錯誤: %s", e)
         return {"error": str(e)}
 
 
-def query_aws_price(params):
+def _start_task(coro):
+    """創建後台任務並保留引用，避免任務在完成前被回收"""
+    task = asyncio.get_running_loop().create_task(coro)
+    _EXTRACT_TASKS.add(task)
+    task.add_done_callback(_EXTRACT_TASKS.discard)
+    return task
+
+
+async def _extract_batch_worker(queue):
+    """從隊列中收集時間窗口內到達的查詢 (最多EXTRACT_BATCH_SIZE個)，合併提取參數"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await queue.get()]
+        deadline = loop.time() + EXTRACT_BATCH_WINDOW
+        while len(batch) < EXTRACT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        # 在獨立任務中調用OpenAI，不阻塞下一批查詢的收集
+        _start_task(_resolve_extract_batch(batch))
+
+
+async def _resolve_extract_batch(batch):
+    """提取一批查詢的參數，並將結果分發給各個等待的請求"""
+    queries = [query for query, _ in batch]
+    try:
+        if len(queries) == 1:
+            results = [await _extract_single(queries[0])]
+        else:
+            try:
+                results = await _extract_many(queries)
+            except Exception as e:
+                # 合併提取失敗時逐個提取，避免一個批次的問題影響所有請求
+                logger.error("合併提取參數時出錯，改為逐個提取: %s", e)
+                results = await asyncio.gather(
+                    *(_extract_single(query) for query in queries))
+    except Exception as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    for (_, future), result in zip(batch, results):
+        if not future.done():
+            future.set_result(result)
+
+
+async def _extract_single(query):
+    """使用OpenAI函數調用功能提取單個查詢的參數"""
+    response = await openai_client.chat.completions.create(
+        model=EXTRACT_MODEL,
+        seed=0,
+        temperature=0,
+        messages=[
+            {"role": "system", "content": _EXTRACT_SYSTEM_PROMPT},
+            {"role": "user", "content": query}
+        ],
+        functions=_EXTRACT_FUNCTIONS,
+        function_call={"name": "get_aws_price"}
+    )
+
+    # 從回應中提取函數參數
+    return jsonx.loads(response.choices[0].message.function_call.arguments)
+
+
+async def _extract_many(queries):
+    """一次OpenAI調用提取多個查詢的參數，按查詢順序返回
+
+    查詢來自不同用戶，以JSON數組發送，避免查詢文本偽造其他查詢的邊界；
+    每個結果的index必須恰好覆蓋所有查詢，否則拋出異常，由調用方改為逐個提取
+    """
+    response = await openai_client.chat.completions.create(
+        model=EXTRACT_MODEL,
+        seed=0,
+        temperature=0,
+        messages=[
+            {"role": "system", "content": _EXTRACT_SYSTEM_PROMPT},
+            {"role": "user", "content": f"以下JSON字符串數組包含{len(queries)}個互相獨立的查詢，請分別提取參數，每個查詢返回一個結果，index為該查詢在數組中的位置 (從0開始):\n{jsonx.dumps(queries)}"}
+        ],
+        functions=_EXTRACT_BATCH_FUNCTIONS,
+        function_call={"name": "get_aws_prices"}
+    )
+
+    results = jsonx.loads(
+        response.choices[0].message.function_call.arguments)['results']
+    ordered = [None] * len(queries)
+    for result in results:
+        index = result.pop('index', None)
+        if (type(index) is not int or not 0 <= index < len(queries)
+                or ordered[index] is not None):
+            raise ValueError(f"結果的index無效或重複: {index}")
+        ordered[index] = result
+    if None in ordered:
+        raise ValueError(f"返回了{len(results)}個結果，預期{len(queries)}個")
+    return ordered
+
+
+def _get_products(client, service_code, filters):
+    """分頁獲取符合過濾器的產品 (最多MAX_PRICE_ITEMS個)"""
+    # 使用分頁器獲取所有頁面，避免結果被截斷在第一頁
+    paginator = client.get_paginator('get_products')
+    pages = paginator.paginate(
+        ServiceCode=service_code,
+        Filters=filters,
+        PaginationConfig={'PageSize': 100, 'MaxItems': MAX_PRICE_ITEMS}
+    )
+    price_list = []
+    for page in pages:
+        price_list.extend(page['PriceList'])
+
+    return {'PriceList': price_list}
+
+
+def _download_offer(region_code, path):
+    """將地區的EC2價格清單流式寫入文件，不在內存中保留整個文件"""
+    url = OFFER_URL.format(region=region_code)
+    with httpx.stream('GET', url, timeout=PRICE_INDEX_TIMEOUT) as response:
+        response.raise_for_status()
+        with open(path, 'wb') as f:
+            for chunk in response.iter_bytes(1 << 20):
+                f.write(chunk)
+
+
+def _index_offer_file(path):
+    """增量解析EC2價格清單文件，取出共享租用的計算實例，按(實例類型, 操作系統, 租用方式)索引
+
+    分兩遍掃描文件：先從products中取出符合條件的產品並解析為記錄 (此時還沒有價格)，
+    再從terms.OnDemand中補上這些產品的價格，內存中只保留解析後的精簡記錄
+    """
+    rows = {}
+    with open(path, 'rb') as f:
+        for sku, product in ijson.kvitems(f, 'products'):
+            attributes = product.get('attributes', {})
+            if (product.get('productFamily') != 'Compute Instance'
+                    or attributes.get('tenancy') != 'Shared'):
+                continue
+            rows[sku] = _parse_ec2_product({'product': product})
+
+    with open(path, 'rb') as f:
+        for sku, terms in ijson.kvitems(f, 'terms.OnDemand'):
+            row = rows.get(sku)
+            if row is not None:
+                row['onDemandPrice'] = _first_price({'terms': {'OnDemand': terms}})
+
+    index = {}
+    for row in rows.values():
+        key = (row['instanceType'], row['operatingSystem'], 'Shared')
+        index.setdefault(key, []).append(row)
+    return index
+
+
+def _read_region_index(index_file, version):
+    """讀取指定版本 (日期) 的索引文件，文件不存在、損壞或已過期時返回None"""
+    try:
+        with open(index_file, 'rb') as f:
+            data = pickle.load(f)
+        if data['version'] == version:
+            return data['index']
+    except (OSError, EOFError, KeyError, pickle.UnpicklingError):
+        pass
+    return None
+
+
+def load_region_index(region_code):
+    """加載一個地區的EC2價格索引：當天的索引文件存在時直接讀取，否則下載價格清單重建
+
+    多個worker進程通過文件鎖協調，只有一個進程下載和構建，其他進程等待後讀取其結果
+    """
+    import fcntl  # 僅在啟用價格索引時需要 (Windows沒有此模塊)
+
+    version = date.today().isoformat()
+    index_file = os.path.join(PRICE_INDEX_DIR, f"{region_code}.pickle")
+
+    try:
+        index = _read_region_index(index_file, version)
+        if index is not None:
+            _PRICE_INDEX[REGION_MAPPING[region_code]] = index
+            logger.info("已從文件加載EC2價格索引: %s", region_code)
+            return
+
+        os.makedirs(PRICE_INDEX_DIR, exist_ok=True)
+        lock_file = os.path.join(PRICE_INDEX_DIR, f"{region_code}.lock")
+        with open(lock_file, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            # 等待鎖期間其他進程可能已經構建完成
+            index = _read_region_index(index_file, version)
+            if index is not None:
+                _PRICE_INDEX[REGION_MAPPING[region_code]] = index
+                logger.info("已從文件加載EC2價格索引: %s", region_code)
+                return
+
+            logger.info("開始下載EC2價格清單: %s", region_code)
+            offer_file = f"{index_file}.{os.getpid()}.json"
+            try:
+                _download_offer(region_code, offer_file)
+                index = _index_offer_file(offer_file)
+            finally:
+                if os.path.exists(offer_file):
+                    os.remove(offer_file)
+
+            # 先寫入臨時文件再替換，避免其他進程讀到寫了一半的文件
+            tmp_file = f"{index_file}.{os.getpid()}.tmp"
+            with open(tmp_file, 'wb') as f:
+                pickle.dump({'version': version, 'index': index},
+                            f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, index_file)
+
+        _PRICE_INDEX[REGION_MAPPING[region_code]] = index
+        logger.info("EC2價格索引構建完成: %s, %d個組合", region_code, len(index))
+    except Exception as e:
+        logger.error("構建EC2價格索引時出錯 (%s): %s", region_code, e)
+        with _PRICE_INDEX_LOCK:
+            _PRICE_INDEX_FAILED[region_code] = time.monotonic()
+    else:
+        with _PRICE_INDEX_LOCK:
+            _PRICE_INDEX_FAILED.pop(region_code, None)
+    finally:
+        with _PRICE_INDEX_LOCK:
+            _PRICE_INDEX_LOADING.discard(region_code)
+
+
+def schedule_region_index(region_code):
+    """在後台線程中加載地區的價格索引，同一地區同時只加載一次
+
+    最近構建失敗的地區在PRICE_INDEX_RETRY秒內不再重試
+    """
+    with _PRICE_INDEX_LOCK:
+        if region_code in _PRICE_INDEX_LOADING:
+            return
+        failed_at = _PRICE_INDEX_FAILED.get(region_code)
+        if failed_at is not None and time.monotonic() - failed_at < PRICE_INDEX_RETRY:
+            return
+        _PRICE_INDEX_LOADING.add(region_code)
+    threading.Thread(
+        target=load_region_index, args=(region_code,), daemon=True).start()
+
+
+def _refresh_price_index():
+    """每天重新加載已索引和曾經構建失敗的地區，價格清單一般每天最多更新一次"""
+    with _PRICE_INDEX_LOCK:
+        failed = list(_PRICE_INDEX_FAILED)
+        _PRICE_INDEX_FAILED.clear()
+    for region_name in list(_PRICE_INDEX):
+        schedule_region_index(_LOCATION_TO_REGION[region_name])
+    for region_code in failed:
+        schedule_region_index(region_code)
+
+    timer = threading.Timer(PRICE_INDEX_REFRESH, _refresh_price_index)
+    timer.daemon = True
+    timer.start()
+
+
+@app.before_serving
+async def start_price_index():
+    """啟用價格索引時，在後台預加載指定地區並開始每日刷新，加載完成前查詢仍直接調用API"""
+    if PRICE_INDEX_ENABLED:
+        for region_code in PRICE_INDEX_REGIONS:
+            schedule_region_index(region_code)
+
+        timer = threading.Timer(PRICE_INDEX_REFRESH, _refresh_price_index)
+        timer.daemon = True
+        timer.start()
+
+
+async def _fetch_products(client, service_code, filters):
+    """在Pricing API專用線程池中執行_get_products (boto3為同步調用，不能阻塞事件循環)"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        PRICING_EXECUTOR, _get_products, client, service_code, filters)
+
+
+def _result_cache_key(params):
+    """將查詢參數規範化為可哈希的緩存鍵"""
+    items = []
+    for name, value in params.items():
+        value = str(value).strip()
+        if name in _CASE_INSENSITIVE_PARAMS:
+            value = value.lower()
+        items.append((name, value))
+    return hashkey(*sorted(items))
+
+
+async def query_aws_price(params):
+    """查詢AWS價格，相同參數的成功結果緩存一小時"""
+    key = _result_cache_key(params)
+    cached = _RESULT_CACHE.get(key)
+    if cached is not None:
+        logger.info("命中價格查詢結果緩存")
+        return list(cached)
+
+    result = await _query_aws_price(params)
+    if isinstance(result, list):
+        _RESULT_CACHE[key] = result
+    return result
+
+
+async def _query_aws_price(params):
     """查詢AWS價格"""
-    logger.info(f"查詢AWS價格使用參數: {params}")
+    logger.info("查詢AWS價格使用參數: %s", params)
 
     try:
-        client = create_aws_client()
+        client = get_aws_client()
         service = params.get('service', '').lower()
 
         # 獲取區域代碼和名稱
         region_code = None
         region_name = None
-        if 'region' in params:
-            # 處理區域參數
-            if params['region'].lower() == '東京' or '東京' in params['region'].lower():
-                region_code = 'ap-northeast-1'
+        region = str(params.get('region') or '').strip()
+        if region:
+            # 處理區域參數 (支持地區代碼、城市名稱和價格API地區名稱)，空值視為未指定
+            raw_region = region.lower()
+            if _REGION_RE.match(raw_region):
+                region_code = raw_region
             else:
-                region_code = params['region']
-
-            # 區域代碼到AWS Price List API位置名稱的映射
-            region_mapping = {
-                'us-east-1': 'US East (N. Virginia)',
-                'us-east-2': 'US East (Ohio)',
-                'us-west-1': 'US West (N. California)',
-                'us-west-2': 'US West (Oregon)',
-                'ap-east-1': 'Asia Pacific (Hong Kong)',
-                'ap-south-1': 'Asia Pacific (Mumbai)',
-                'ap-northeast-1': 'Asia Pacific (Tokyo)',
-                'ap-northeast-2': 'Asia Pacific (Seoul)',
-                'ap-northeast-3': 'Asia Pacific (Osaka)',
-                'ap-southeast-1': 'Asia Pacific (Singapore)',
-                'ap-southeast-2': 'Asia Pacific (Sydney)',
-                'ca-central-1': 'Canada (Central)',
-                'eu-central-1': 'EU (Frankfurt)',
-                'eu-west-1': 'EU (Ireland)',
-                'eu-west-2': 'EU (London)',
-                'eu-west-3': 'EU (Paris)',
-                'eu-north-1': 'EU (Stockholm)',
-                'sa-east-1': 'South America (Sao Paulo)',
-            }
-            region_name = region_mapping.get(region_code, region_code)
-            logger.info(f"處理區域: 代碼={region_code}, 名稱={region_name}")
+                region_code = _match_rule(
+                    _REGION_ALIAS_RULES, raw_region, raw_region)
+
+            region_name = (REGION_MAPPING.get(region_code)
+                           or _LOCATION_NAMES.get(raw_region))
+            if region_name is None:
+                if _REGION_RE.match(region_code):
+                    return {"error": f"暫不支援的地區: {region}"}
+                return {"error": f"無法識別的地區: {region}"}
+            logger.info("處理區域: 代碼=%s, 名稱=%s", region_code, region_name)
 
         # 處理不同的AWS服務
         if service == 'ec2':
-            return query_ec2_price(client, params, region_name)
+            return await query_ec2_price(client, params, region_name)
         elif service == 's3':
-            return query_s3_price(client, params, region_name)
+            return await query_s3_price(client, params, region_name)
         elif service == 'rds':
-            return query_rds_price(client, params, region_name)
+            return await query_rds_price(client, params, region_name)
         elif service == 'lambda':
-            return query_lambda_price(client, params, region_name)
+            return await query_lambda_price(client, params, region_name)
         elif service == 'dynamodb':
-            return query_dynamodb_price(client, params, region_name)
+            return await query_dynamodb_price(client, params, region_name)
         else:
             return {"error": f"目前尚未支援 {params.get('service', 'unknown')} 服務的價格查詢"}
 
     except Exception as e:
-        logger.error(f"AWS價格API調用錯誤: {str(e)}")
+        logger.error("AWS價格API調用錯誤: %s", e)
         return {"error": str(e)}
 
 
-def query_ec2_price(client, params, region_name):
-    """查詢EC2價格"""
-    filters = []
+@lru_cache(maxsize=256)
+def _build_ec2_filters(instance_type, region_name, os_term):
+    """構建EC2查詢的完整過濾器和基本過濾器，相同參數的結果在請求之間重複使用
+
+    返回的過濾器字典被多個請求共用，不能修改
+    """
+    filters = [*EC2_STATIC_FILTERS]
 
     # 添加實例類型過濾器
-    if 'instance_type' in params:
+    if instance_type:
         filters.append({
             'Type': 'TERM_MATCH',
             'Field': 'instanceType',
-            'Value': params['instance_type']
+            'Value': instance_type
         })
 
     # 添加區域過濾器
@@ -175,112 +1008,133 @@ def query_ec2_price(client, params, region_name):
             'Field': 'location',
             'Value': region_name
         })
-        logger.info(f"使用區域過濾器: {region_name}")
 
     # 添加操作系統過濾器
-    if 'os' in params:
-        os_value = params['os'].lower()
-        if 'linux' in os_value:
-            os_term = 'Linux'
-        elif 'windows' in os_value:
-            os_term = 'Windows'
-        else:
-            os_term = params['os']
-
+    if os_term:
         filters.append({
             'Type': 'TERM_MATCH',
             'Field': 'operatingSystem',
             'Value': os_term
         })
 
-    # 添加其他必要的過濾器
-    filters.append({
-        'Type': 'TERM_MATCH',
-        'Field': 'productFamily',
-        'Value': 'Compute Instance'
-    })
+    # 基本過濾器只保留實例類型和地區，用於完整過濾器沒有結果的情況
+    basic_filters = [
+        f for f in filters if f['Field'] in ('instanceType', 'location')
+    ]
+    return tuple(filters), tuple(basic_filters)
 
-    filters.append({
-        'Type': 'TERM_MATCH',
-        'Field': 'tenancy',
-        'Value': 'Shared'
-    })
 
-    logger.info(f"EC2價格查詢過濾器: {json.dumps(filters)}")
+async def query_ec2_price(client, params, region_name):
+    """查詢EC2價格"""
+    os_term = None
+    if 'os' in params:
+        os_term = _match_rule(_OS_RULES, params['os'].casefold(), params['os'])
 
-    # 執行API查詢
-    response = client.get_products(
-        ServiceCode='AmazonEC2',
-        Filters=filters
+    filters, basic_filters = _build_ec2_filters(
+        params.get('instance_type'), region_name, os_term)
+    if region_name:
+        logger.info("使用區域過濾器: %s", region_name)
+
+    # 地區的價格索引已加載時直接查表，無需調用API；未加載時在後台開始加載
+    if PRICE_INDEX_ENABLED and region_name:
+        region_index = _PRICE_INDEX.get(region_name)
+        if region_index is None:
+            schedule_region_index(_LOCATION_TO_REGION[region_name])
+        elif os_term and 'instance_type' in params:
+            rows = region_index.get((params['instance_type'], os_term, 'Shared'))
+            if rows:
+                logger.info("命中EC2價格索引")
+                return [dict(row) for row in rows]
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("EC2價格查詢過濾器: %s", jsonx.dumps(filters))
+
+    # 同時執行完整查詢和基本查詢，回退時無需再等待一次API往返 (boto3需要列表)
+    response, basic_response = await asyncio.gather(
+        _fetch_products(client, 'AmazonEC2', list(filters)),
+        _fetch_products(client, 'AmazonEC2', list(basic_filters)),
+        return_exceptions=True
     )
+    if isinstance(response, Exception):
+        raise response
 
-    logger.info(f"API響應PriceList元素數量: {len(response['PriceList'])}")
+    logger.info("API響應PriceList元素數量: %d", len(response['PriceList']))
 
-    # 如果沒有找到結果，嘗試使用更少的過濾器
+    # 如果沒有找到結果，使用更少過濾器的查詢結果
     if len(response['PriceList']) == 0:
-        logger.info("未找到結果，嘗試使用更少的過濾器")
-        # 重新構建基本過濾器
-        basic_filters = []
-
-        # 只保留實例類型和地區過濾器
-        if 'instance_type' in params:
-            basic_filters.append({
-                'Type': 'TERM_MATCH',
-                'Field': 'instanceType',
-                'Value': params['instance_type']
-            })
+        logger.info("未找到結果，使用更少過濾器的查詢結果")
+        if isinstance(basic_response, Exception):
+            logger.error("簡化EC2查詢時出錯: %s", basic_response)
+        else:
+            response = basic_response
 
-        if region_name:
-            basic_filters.append({
-                'Type': 'TERM_MATCH',
-                'Field': 'location',
-                'Value': region_name
-            })
+    # 解析返回的價格數據
+    return [_parse_ec2_product(product) for product in response['PriceList']]
 
-        try:
-            response = client.get_products(
-                ServiceCode='AmazonEC2',
-                Filters=basic_filters
-            )
-        except Exception as e:
-            logger.error(f"簡化EC2查詢時出錯: {str(e)}")
 
-    # 解析返回的價格數據
-    pricing_data = []
-    for product_str in response['PriceList']:
-        product = json.loads(product_str)
-
-        # 從對象中提取價格信息
-        instance_details = product['product']['attributes']
-        instance_type = instance_details.get('instanceType', 'N/A')
-        os = instance_details.get('operatingSystem', 'N/A')
-        region = instance_details.get('location', 'N/A')
-
-        # 提取價格
-        on_demand_price = None
+def _attribute_getter(*keys):
+    """創建一次取出多個產品屬性的函數，缺少屬性時以N/A補齊"""
+    getter = itemgetter(*keys)
+
+    def get_attributes(attributes):
         try:
-            terms = product.get('terms', {}).get('OnDemand', {})
-            if terms:
-                price_dimensions = next(iter(terms.values()))[
-                    'priceDimensions']
-                price_info = next(iter(price_dimensions.values()))
-                on_demand_price = price_info.get(
-                    'pricePerUnit', {}).get('USD', 'N/A')
-        except Exception as e:
-            logger.error(f"EC2價格解析錯誤: {str(e)}")
+            return getter(attributes)
+        except KeyError:
+            return tuple(attributes.get(key, 'N/A') for key in keys)
 
-        pricing_data.append({
-            'instanceType': instance_type,
-            'operatingSystem': os,
-            'region': region,
-            'onDemandPrice': on_demand_price,
-            'unit': 'USD per Hour'
-        })
+    return get_attributes
 
-    return pricing_data
+
+_EC2_ATTRIBUTES = _attribute_getter('instanceType', 'operatingSystem', 'location')
+_S3_ATTRIBUTES = _attribute_getter('storageClass', 'volumeType', 'location')
+_RDS_ATTRIBUTES = _attribute_getter(
+    'databaseEngine', 'instanceType', 'deploymentOption', 'location')
+_GROUP_ATTRIBUTES = _attribute_getter('group', 'location')
 
 
-def query_s3_price(client, params, region_name):
+def _price_dimensions(product):
+    """提取產品按需價格的所有價格維度 (價格、描述、單位)"""
+    return [
+        {
+            'price': dim.get('pricePerUnit', {}).get('USD', 'N/A'),
+            'description': dim.get('description', ''),
+            'unit': dim.get('unit', '')
+        }
+        for term in product.get('terms', {}).get('OnDemand', {}).values()
+        for dim in term.get('priceDimensions', {}).values()
+    ]
+
+
+def _first_price(product):
+    """返回產品第一個按需價格維度的美元價格，沒有價格維度時返回None
+
+    只讀取不修改產品對象 (不用popitem)
+    """
+    for term in product.get('terms', {}).get('OnDemand', {}).values():
+        for dim in term.get('priceDimensions', {}).values():
+            return dim.get('pricePerUnit', {}).get('USD', 'N/A')
+    return None
+
+
+def _parse_ec2_product(product):
+    """解析單個EC2產品的價格信息"""
+    # 從對象中提取價格信息
+    instance_type, operating_system, region = _EC2_ATTRIBUTES(
+        product['product']['attributes'])
+
+    # 提取價格 (EC2按需價格只有一個價格維度)
+    on_demand_price = _first_price(product)
+
+    return {
+        'instanceType': instance_type,
+        'operatingSystem': operating_system,
+        'region': region,
+        'onDemandPrice': on_demand_price,
+        'unit': 'USD per Hour'
+    }
+
+
+async def query_s3_price(client, params, region_name):
     """查詢S3價格"""
     filters = []
 
@@ -295,19 +1149,8 @@ def query_s3_price(client, params, region_name):
     # 處理儲存類型 (標準/智能分層/冷藏等)
     storage_class = "Standard"  # 默認值
     if 'storage_class' in params:
-        s_class = params['storage_class'].lower()
-        if '標準' in s_class or 'standard' in s_class:
-            storage_class = "Standard"
-        elif '智能' in s_class or 'intelligent' in s_class:
-            storage_class = "Intelligent-Tiering"
-        elif '冷藏' in s_class or 'glacier' in s_class:
-            storage_class = "Glacier"
-        elif '深度' in s_class or 'deep' in s_class:
-            storage_class = "Glacier Deep Archive"
-        elif '單區域' in s_class or 'one zone' in s_class:
-            storage_class = "One Zone"
-        elif '標準-不頻繁' in s_class or 'infrequent' in s_class:
-            storage_class = "Standard - Infrequent Access"
+        storage_class = _match_rule(
+            _S3_RULES, params['storage_class'].casefold(), storage_class)
 
     filters.append({
         'Type': 'TERM_MATCH',
@@ -315,67 +1158,30 @@ def query_s3_price(client, params, region_name):
         'Value': storage_class
     })
 
-    logger.info(f"S3價格查詢過濾器: {json.dumps(filters)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("S3價格查詢過濾器: %s", jsonx.dumps(filters))
 
     # 執行API查詢
-    response = client.get_products(
-        ServiceCode='AmazonS3',
-        Filters=filters
-    )
+    response = await _fetch_products(client, 'AmazonS3', filters)
 
-    logger.info(f"S3 API響應PriceList元素數量: {len(response['PriceList'])}")
+    logger.info("S3 API響應PriceList元素數量: %d", len(response['PriceList']))
 
     # 解析返回的價格數據
-    pricing_data = []
-    for product_str in response['PriceList']:
-        product = json.loads(product_str)
-
-        # 從對象中提取屬性
-        s3_details = product['product']['attributes']
-        storage_class = s3_details.get('storageClass', 'N/A')
-        volume_type = s3_details.get('volumeType', 'N/A')
-        region = s3_details.get('location', 'N/A')
-
-        # 提取價格
-        try:
-            terms = product.get('terms', {}).get('OnDemand', {})
-            if terms:
-                for term_key, term_value in terms.items():
-                    price_dimensions = term_value.get('priceDimensions', {})
-                    for dim_key, dim_value in price_dimensions.items():
-                        # 獲取價格單位和描述
-                        price = dim_value.get(
-                            'pricePerUnit', {}).get('USD', 'N/A')
-                        description = dim_value.get('description', '')
-                        unit = dim_value.get('unit', '')
-
-                        pricing_data.append({
-                            'storageClass': storage_class,
-                            'volumeType': volume_type,
-                            'region': region,
-                            'price': price,
-                            'description': description,
-                            'unit': unit
-                        })
-        except Exception as e:
-            logger.error(f"S3價格解析錯誤: {str(e)}")
+    pricing_data = [
+        item
+        for product in response['PriceList']
+        for item in _parse_s3_product(product)
+    ]
 
     # 計算特定容量的價格（如果指定了容量）
     if 'storage_size' in params and pricing_data:
         try:
-            size_str = params['storage_size']
             # 提取數字和單位 (GB, TB 等)
-            import re
-            match = re.search(r'(\d+)\s*([a-zA-Z]+)?', size_str)
+            match = _SIZE_RE.search(params['storage_size'])
             if match:
-                size = float(match.group(1))
-                unit = match.group(2).upper() if match.group(2) else 'GB'
-
                 # 轉換為GB (AWS S3定價通常以GB為單位)
-                if unit == 'TB':
-                    size *= 1024
-                elif unit == 'MB':
-                    size /= 1024
+                unit = (match.group(2) or 'GB').upper()
+                size = float(match.group(1)) * _SIZE_UNIT_TO_GB.get(unit, 1.0)
 
                 # 添加總價計算
                 for item in pricing_data:
@@ -384,12 +1190,30 @@ def query_s3_price(client, params, region_name):
                             item['price']) * size if item['price'] != 'N/A' else 'N/A'
                         item['estimatedCostUnit'] = 'USD per Month'
         except Exception as e:
-            logger.error(f"計算S3存儲總價時出錯: {str(e)}")
+            logger.error("計算S3存儲總價時出錯: %s", e)
 
     return pricing_data
 
 
-def query_rds_price(client, params, region_name):
+def _parse_s3_product(product):
+    """解析單個S3產品，返回其所有價格維度"""
+    # 從對象中提取屬性
+    storage_class, volume_type, region = _S3_ATTRIBUTES(
+        product['product']['attributes'])
+
+    # 每個價格維度一條記錄
+    return [
+        {
+            'storageClass': storage_class,
+            'volumeType': volume_type,
+            'region': region,
+            **dimension
+        }
+        for dimension in _price_dimensions(product)
+    ]
+
+
+async def query_rds_price(client, params, region_name):
     """查詢RDS價格"""
     filters = []
 
@@ -403,25 +1227,11 @@ def query_rds_price(client, params, region_name):
 
     # 處理數據庫引擎
     if 'db_engine' in params:
-        engine = params['db_engine'].lower()
-        db_engine = "MySQL"  # 默認值
-
-        if 'mysql' in engine:
-            db_engine = "MySQL"
-        elif 'postgresql' in engine or 'postgres' in engine:
-            db_engine = "PostgreSQL"
-        elif 'oracle' in engine:
-            db_engine = "Oracle"
-        elif 'sqlserver' in engine or 'sql server' in engine:
-            db_engine = "SQL Server"
-        elif 'aurora' in engine:
-            db_engine = "Aurora "
-            if 'mysql' in engine:
-                db_engine += "MySQL"
-            elif 'postgresql' in engine:
-                db_engine += "PostgreSQL"
-        elif 'mariadb' in engine:
-            db_engine = "MariaDB"
+        engine = params['db_engine'].casefold()
+        db_engine = _match_rule(_DB_RULES, engine, "MySQL")  # 默認值為MySQL
+        if 'aurora' in engine:
+            # Aurora只有MySQL和PostgreSQL兼容版本
+            db_engine = f"Aurora {db_engine}"
 
         filters.append({
             'Type': 'TERM_MATCH',
@@ -437,56 +1247,42 @@ def query_rds_price(client, params, region_name):
             'Value': params['instance_type']
         })
 
-    logger.info(f"RDS價格查詢過濾器: {json.dumps(filters)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("RDS價格查詢過濾器: %s", jsonx.dumps(filters))
 
     # 執行API查詢
-    response = client.get_products(
-        ServiceCode='AmazonRDS',
-        Filters=filters
-    )
+    response = await _fetch_products(client, 'AmazonRDS', filters)
 
-    logger.info(f"RDS API響應PriceList元素數量: {len(response['PriceList'])}")
+    logger.info("RDS API響應PriceList元素數量: %d", len(response['PriceList']))
 
     # 解析返回的價格數據
-    pricing_data = []
-    for product_str in response['PriceList']:
-        product = json.loads(product_str)
-
-        # 從對象中提取屬性
-        rds_details = product['product']['attributes']
-        db_engine = rds_details.get('databaseEngine', 'N/A')
-        instance_type = rds_details.get('instanceType', 'N/A')
-        deployment_option = rds_details.get('deploymentOption', 'N/A')
-        region = rds_details.get('location', 'N/A')
-
-        # 提取價格
-        try:
-            terms = product.get('terms', {}).get('OnDemand', {})
-            if terms:
-                for term_key, term_value in terms.items():
-                    price_dimensions = term_value.get('priceDimensions', {})
-                    for dim_key, dim_value in price_dimensions.items():
-                        price = dim_value.get(
-                            'pricePerUnit', {}).get('USD', 'N/A')
-                        description = dim_value.get('description', '')
-                        unit = dim_value.get('unit', '')
-
-                        pricing_data.append({
-                            'databaseEngine': db_engine,
-                            'instanceType': instance_type,
-                            'deploymentOption': deployment_option,
-                            'region': region,
-                            'price': price,
-                            'description': description,
-                            'unit': unit
-                        })
-        except Exception as e:
-            logger.error(f"RDS價格解析錯誤: {str(e)}")
-
-    return pricing_data
+    return [
+        item
+        for product in response['PriceList']
+        for item in _parse_rds_product(product)
+    ]
+
+
+def _parse_rds_product(product):
+    """解析單個RDS產品，返回其所有價格維度"""
+    # 從對象中提取屬性
+    db_engine, instance_type, deployment_option, region = _RDS_ATTRIBUTES(
+        product['product']['attributes'])
+
+    # 每個價格維度一條記錄
+    return [
+        {
+            'databaseEngine': db_engine,
+            'instanceType': instance_type,
+            'deploymentOption': deployment_option,
+            'region': region,
+            **dimension
+        }
+        for dimension in _price_dimensions(product)
+    ]
 
 
-def query_lambda_price(client, params, region_name):
+async def query_lambda_price(client, params, region_name):
     """查詢Lambda價格"""
     filters = []
 
@@ -498,52 +1294,39 @@ def query_lambda_price(client, params, region_name):
             'Value': region_name
         })
 
-    logger.info(f"Lambda價格查詢過濾器: {json.dumps(filters)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Lambda價格查詢過濾器: %s", jsonx.dumps(filters))
 
     # 執行API查詢
-    response = client.get_products(
-        ServiceCode='AWSLambda',
-        Filters=filters
-    )
+    response = await _fetch_products(client, 'AWSLambda', filters)
 
-    logger.info(f"Lambda API響應PriceList元素數量: {len(response['PriceList'])}")
+    logger.info("Lambda API響應PriceList元素數量: %d", len(response['PriceList']))
 
     # 解析返回的價格數據
-    pricing_data = []
-    for product_str in response['PriceList']:
-        product = json.loads(product_str)
-
-        # 從對象中提取屬性
-        lambda_details = product['product']['attributes']
-        region = lambda_details.get('location', 'N/A')
-        group = lambda_details.get('group', 'N/A')
-
-        # 提取價格
-        try:
-            terms = product.get('terms', {}).get('OnDemand', {})
-            if terms:
-                for term_key, term_value in terms.items():
-                    price_dimensions = term_value.get('priceDimensions', {})
-                    for dim_key, dim_value in price_dimensions.items():
-                        price = dim_value.get(
-                            'pricePerUnit', {}).get('USD', 'N/A')
-                        description = dim_value.get('description', '')
-                        unit = dim_value.get('unit', '')
-
-                        pricing_data.append({
-                            'group': group,
-                            'region': region,
-                            'price': price,
-                            'description': description,
-                            'unit': unit
-                        })
-        except Exception as e:
-            logger.error(f"Lambda價格解析錯誤: {str(e)}")
-
-    return pricing_data
+    return [
+        item
+        for product in response['PriceList']
+        for item in _parse_lambda_product(product)
+    ]
+
+
+def _parse_lambda_product(product):
+    """解析單個Lambda產品，返回其所有價格維度"""
+    # 從對象中提取屬性
+    group, region = _GROUP_ATTRIBUTES(product['product']['attributes'])
+
+    # 每個價格維度一條記錄
+    return [
+        {
+            'group': group,
+            'region': region,
+            **dimension
+        }
+        for dimension in _price_dimensions(product)
+    ]
 
 
-def query_dynamodb_price(client, params, region_name):
+async def query_dynamodb_price(client, params, region_name):
     """查詢DynamoDB價格"""
     filters = []
 
@@ -555,97 +1338,175 @@ def query_dynamodb_price(client, params, region_name):
             'Value': region_name
         })
 
-    logger.info(f"DynamoDB價格查詢過濾器: {json.dumps(filters)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("DynamoDB價格查詢過濾器: %s", jsonx.dumps(filters))
 
     # 執行API查詢
-    response = client.get_products(
-        ServiceCode='AmazonDynamoDB',
-        Filters=filters
-    )
+    response = await _fetch_products(client, 'AmazonDynamoDB', filters)
 
-    logger.info(f"DynamoDB API響應PriceList元素數量: {len(response['PriceList'])}")
+    logger.info("DynamoDB API響應PriceList元素數量: %d", len(response['PriceList']))
 
     # 解析返回的價格數據
-    pricing_data = []
-    for product_str in response['PriceList']:
-        product = json.loads(product_str)
+    return [
+        item
+        for product in response['PriceList']
+        for item in _parse_dynamodb_product(product)
+    ]
+
+
+def _parse_dynamodb_product(product):
+    """解析單個DynamoDB產品，返回其所有價格維度"""
+    # 從對象中提取屬性
+    group, region = _GROUP_ATTRIBUTES(product['product']['attributes'])
+
+    # 每個價格維度一條記錄
+    return [
+        {
+            'group': group,
+            'region': region,
+            **dimension
+        }
+        for dimension in _price_dimensions(product)
+    ]
 
-        # 從對象中提取屬性
-        dynamodb_details = product['product']['attributes']
-        region = dynamodb_details.get('location', 'N/A')
-        group = dynamodb_details.get('group', 'N/A')
 
-        # 提取價格
-        try:
-            terms = product.get('terms', {}).get('OnDemand', {})
-            if terms:
-                for term_key, term_value in terms.items():
-                    price_dimensions = term_value.get('priceDimensions', {})
-                    for dim_key, dim_value in price_dimensions.items():
-                        price = dim_value.get(
-                            'pricePerUnit', {}).get('USD', 'N/A')
-                        description = dim_value.get('description', '')
-                        unit = dim_value.get('unit', '')
-
-                        pricing_data.append({
-                            'group': group,
-                            'region': region,
-                            'price': price,
-                            'description': description,
-                            'unit': unit
-                        })
-        except Exception as e:
-            logger.error(f"DynamoDB價格解析錯誤: {str(e)}")
+def _no_pricing_message(pricing_data):
+    """價格數據無法用於生成回應時返回給用戶的提示，否則返回None"""
+    if isinstance(pricing_data, dict) and 'error' in pricing_data:
+        return f"抱歉，在獲取價格時出現問題: {pricing_data['error']}"
 
-    return pricing_data
+    if not pricing_data:
+        return "抱歉，使用提供的參數沒有找到任何價格信息。請嘗試使用不同的參數或更具體的查詢。"
 
+    return None
 
-def generate_response_with_openai(query, pricing_data):
-    """使用OpenAI生成自然語言回應"""
-    logger.info(f"生成回應: 查詢={query}, 數據={pricing_data}")
 
+def _price_value(price):
+    """將價格字符串轉為數值，無效或為零的價格 (如容量預留記錄) 視為無窮大"""
     try:
-        if isinstance(pricing_data, dict) and 'error' in pricing_data:
-            return f"抱歉，在獲取價格時出現問題: {pricing_data['error']}"
+        value = float(price)
+    except (TypeError, ValueError):
+        return float('inf')
+    return value if value > 0 else float('inf')
+
+
+def _compact_pricing_data(pricing_data):
+    """將價格數據轉為列式結構，減少發送給OpenAI的token數量
+
+    EC2記錄較多時，相同實例類型、操作系統和地區只保留最低價的一條
+    """
+    if not isinstance(pricing_data, list) or not pricing_data:
+        return pricing_data
+
+    if len(pricing_data) > 10 and 'onDemandPrice' in pricing_data[0]:
+        cheapest = {}
+        for item in pricing_data:
+            key = (item['instanceType'], item['operatingSystem'], item['region'])
+            price = _price_value(item['onDemandPrice'])
+            if key not in cheapest or price < cheapest[key][0]:
+                cheapest[key] = (price, item)
+        pricing_data = [item for _, item in cheapest.values()]
+
+    # 各記錄的欄位可能不同 (如S3只有按容量計價的記錄帶估算費用)，取所有記錄欄位的有序並集
+    cols = list(dict.fromkeys(col for item in pricing_data for col in item))
+    return {
+        'cols': cols,
+        'rows': [[item.get(col) for col in cols] for item in pricing_data]
+    }
+
+
+def _response_messages(query, pricing_data):
+    """構建生成自然語言回應所用的對話消息"""
+    pricing_str = jsonx.dumps(_compact_pricing_data(pricing_data))
+    return [
+        {"role": "system", "content": _RESPONSE_SYSTEM_PROMPT},
+        {"role": "user", "content": f"用戶查詢: '{query}'\n價格數據: {pricing_str}"}
+    ]
+
+
+async def generate_response_with_openai(query, pricing_data):
+    """使用OpenAI生成自然語言回應"""
+    logger.info("生成回應: 查詢=%s", query)
+    logger.debug("生成回應數據: %s", pricing_data)
 
-        if not pricing_data:
-            return "抱歉，使用提供的參數沒有找到任何價格信息。請嘗試使用不同的參數或更具體的查詢。"
+    try:
+        message = _no_pricing_message(pricing_data)
+        if message:
+            return message
 
         # 使用OpenAI生成人性化回應
-        pricing_str = json.dumps(pricing_data, ensure_ascii=False)
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "你是一個AWS成本專家，提供準確的價格信息和建議。"},
-                {"role": "user", "content": f"用戶查詢: '{query}'\n\n價格數據: {pricing_str}\n\n請提供簡潔明了的回應，包含用戶請求的價格信息。"}
-            ]
+        response = await openai_client.chat.completions.create(
+            model=RESPONSE_MODEL,
+            seed=0,
+            temperature=0,
+            max_tokens=RESPONSE_MAX_TOKENS,
+            messages=_response_messages(query, pricing_data)
         )
 
         return response.choices[0].message.content
 
     except Exception as e:
-        logger.error(f"生成回應時發生錯誤: {str(e)}")
+        logger.error("生成回應時發生錯誤: %s", e)
         return f"抱歉，在生成回應時遇到問題: {str(e)}"
 
 
+async def stream_response_with_openai(query, pricing_data):
+    """使用OpenAI流式生成自然語言回應，逐段產出文本"""
+    logger.info("流式生成回應: 查詢=%s", query)
+    logger.debug("流式生成回應數據: %s", pricing_data)
+
+    message = _no_pricing_message(pricing_data)
+    if message:
+        yield message
+        return
+
+    try:
+        stream = await openai_client.chat.completions.create(
+            model=RESPONSE_MODEL,
+            seed=0,
+            temperature=0,
+            max_tokens=RESPONSE_MAX_TOKENS,
+            messages=_response_messages(query, pricing_data),
+            stream=True
+        )
+
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    except Exception as e:
+        logger.error("流式生成回應時發生錯誤: %s", e)
+        yield f"抱歉，在生成回應時遇到問題: {str(e)}"
+
+
+def _sse_event(event, data):
+    """格式化一條Server-Sent Events消息 (數據以JSON編碼，避免換行破壞事件格式)"""
+    return f"event: {event}\ndata: {jsonx.dumps(data)}\n\n"
+
+
+async def _request_json():
+    """解析請求體JSON，直接將字節交給orjson，省去先解碼為字符串的步驟"""
+    return app.json.loads(await request.get_data())
+
+
 @app.route('/api/query', methods=['POST'])
-def process_query():
+async def process_query():
     """處理用戶查詢請求"""
     try:
-        data = request.json
+        data = await _request_json()
         query = data.get('query', '')
 
         if not query:
             return jsonify({"error": "請提供查詢內容"}), 400
 
         # 1. 使用OpenAI提取參數
-        parameters = extract_parameters_with_openai(query)
+        parameters = await extract_parameters_with_openai(query)
 
         # 2. 使用參數查詢AWS價格
-        pricing_data = query_aws_price(parameters)
+        pricing_data = await query_aws_price(parameters)
 
         # 3. 生成自然語言回應
-        response_text = generate_response_with_openai(query, pricing_data)
+        response_text = await generate_response_with_openai(query, pricing_data)
 
         return jsonify({
             "query": query,
@@ -655,10 +1516,189 @@ def process_query():
         })
 
     except Exception as e:
-        logger.error(f"處理查詢時發生錯誤: {str(e)}")
+        logger.error("處理查詢時發生錯誤: %s", e)
         return jsonify({"error": f"處理查詢時發生錯誤: {str(e)}"}), 500
 
 
+@app.route('/api/query/stream', methods=['POST'])
+async def process_query_stream():
+    """處理用戶查詢請求，以Server-Sent Events流式返回結果"""
+    try:
+        data = await _request_json()
+        query = data.get('query', '')
+    except Exception as e:
+        logger.error("處理查詢時發生錯誤: %s", e)
+        return jsonify({"error": f"處理查詢時發生錯誤: {str(e)}"}), 500
+
+    if not query:
+        return jsonify({"error": "請提供查詢內容"}), 400
+
+    async def generate():
+        try:
+            # 1. 使用OpenAI提取參數
+            parameters = await extract_parameters_with_openai(query)
+            yield _sse_event('parameters', parameters)
+
+            # 2. 使用參數查詢AWS價格
+            pricing_data = await query_aws_price(parameters)
+            yield _sse_event('pricing_data', pricing_data)
+
+            # 3. 邊生成邊推送自然語言回應
+            async for text in stream_response_with_openai(query, pricing_data):
+                yield _sse_event('response', text)
+
+            yield _sse_event('done', {})
+
+        except Exception as e:
+            logger.error("處理查詢時發生錯誤: %s", e)
+            yield _sse_event('error', {"error": f"處理查詢時發生錯誤: {str(e)}"})
+
+    headers = {
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # 避免反向代理緩衝事件流
+    }
+    return generate(), 200, headers
+
+
+@app.route('/api/query/bulk', methods=['POST'])
+async def submit_bulk_query():
+    """批量查詢：查好價格後通過OpenAI Batch API離線生成回應，返回批次ID"""
+    try:
+        data = await _request_json()
+        queries = data.get('queries', [])
+
+        if (not isinstance(queries, list) or not queries
+                or not all(isinstance(q, str) and q for q in queries)):
+            return jsonify({"error": "請提供查詢內容列表"}), 400
+        if len(queries) > MAX_BULK_QUERIES:
+            return jsonify({"error": f"每次最多提交{MAX_BULK_QUERIES}個查詢"}), 400
+
+        async def prepare(query):
+            parameters = await extract_parameters_with_openai(query)
+            return await query_aws_price(parameters)
+
+        # 參數提取和價格查詢仍即時完成，只有生成回應交給Batch API
+        all_pricing_data = await asyncio.gather(*(prepare(q) for q in queries))
+
+        # 沒有可用價格數據的查詢直接返回固定提示，不佔用Batch API
+        results = []
+        pending = []
+        for i, (query, pricing_data) in enumerate(zip(queries, all_pricing_data)):
+            message = _no_pricing_message(pricing_data)
+            if message:
+                results.append({"index": i, "response": message})
+            else:
+                pending.append((i, query, pricing_data))
+
+        if not pending:
+            return jsonify({"status": "completed", "results": results})
+
+        lines = [
+            jsonx.dumps({
+                "custom_id": str(i),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": RESPONSE_MODEL,
+                    "seed": 0,
+                    "temperature": 0,
+                    "max_tokens": RESPONSE_MAX_TOKENS,
+                    "messages": _response_messages(query, pricing_data)
+                }
+            })
+            for i, query, pricing_data in pending
+        ]
+        batch_file = await openai_client.files.create(
+            file=('queries.jsonl', '\n'.join(lines).encode()),
+            purpose='batch'
+        )
+        batch = await openai_client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint='/v1/chat/completions',
+            completion_window='24h'
+        )
+        _QUERY_CACHE.set(
+            f"bulk:{batch.id}",
+            {"total": len(queries), "results": results},
+            expire=BULK_RESULTS_EXPIRE
+        )
+        logger.info("已提交批量查詢: 批次=%s, 數量=%d", batch.id, len(pending))
+
+        return jsonify({
+            "batch_id": batch.id,
+            "status": batch.status,
+            "results": results
+        }), 202
+
+    except Exception as e:
+        logger.error("提交批量查詢時發生錯誤: %s", e)
+        return jsonify({"error": f"提交批量查詢時發生錯誤: {str(e)}"}), 500
+
+
+def _bulk_error(index, message):
+    """批量查詢中單個查詢失敗時的結果"""
+    return {
+        "index": index,
+        "error": message,
+        "response": f"抱歉，在生成回應時遇到問題: {message}"
+    }
+
+
+def _batch_file_results(text):
+    """解析Batch API輸出或錯誤文件 (JSONL) 中每個請求的結果"""
+    results = []
+    for line in text.splitlines():
+        if not line:
+            continue
+        item = jsonx.loads(line)
+        index = int(item['custom_id'])
+        response = item.get('response') or {}
+        if item.get('error'):
+            results.append(_bulk_error(index, item['error'].get('message')))
+        elif response.get('status_code') != 200:
+            error = response.get('body', {}).get('error') or {}
+            results.append(_bulk_error(
+                index, error.get('message') or f"HTTP {response.get('status_code')}"))
+        else:
+            results.append({
+                "index": index,
+                "response": response['body']['choices'][0]['message']['content']
+            })
+    return results
+
+
+@app.route('/api/query/bulk/<batch_id>', methods=['GET'])
+async def get_bulk_query(batch_id):
+    """獲取批量查詢的狀態，批次結束後返回每個查詢的回應 (失敗或缺失的查詢返回錯誤)"""
+    try:
+        batch = await openai_client.batches.retrieve(batch_id)
+        if batch.status not in BATCH_TERMINAL_STATUSES:
+            return jsonify({"batch_id": batch.id, "status": batch.status})
+
+        cached = _QUERY_CACHE.get(f"bulk:{batch.id}", {})
+        results = list(cached.get("results", []))
+
+        # 成功的請求在輸出文件中，失敗的請求在錯誤文件中 (過期或取消的批次也可能有部分結果)
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await openai_client.files.content(file_id)
+                results.extend(_batch_file_results(content.text))
+
+        # 沒有任何結果的查詢 (如批次驗證失敗) 返回錯誤
+        total = cached.get("total", 0)
+        seen = {r['index'] for r in results}
+        for i in range(total):
+            if i not in seen:
+                results.append(_bulk_error(i, f"批次狀態為{batch.status}，沒有返回結果"))
+        results.sort(key=lambda r: r['index'])
+
+        return jsonify({"batch_id": batch.id, "status": batch.status, "results": results})
+
+    except Exception as e:
+        logger.error("獲取批量查詢結果時發生錯誤: %s", e)
+        return jsonify({"error": f"獲取批量查詢結果時發生錯誤: {str(e)}"}), 500
+
+
 if __name__ == '__main__':
-    port = int(os.getenv('BACKEND_PORT', 3001))
-    app.run(debug=True, host='0.0.0.0', port=port)
+    app.run(host='0.0.0.0', port=BACKEND_PORT)
@@ -0,0 +1,15 @@
+"""gunicorn配置：以uvicorn worker運行ASGI應用
+
+在backend目錄下執行 gunicorn app:app 即可自動加載本配置
+"""
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+bind = f"0.0.0.0:{os.getenv('BACKEND_PORT', '3001')}"
+
+# 每個worker運行一個事件循環，等待OpenAI和AWS回應時可同時處理其他請求
+worker_class = 'uvicorn.workers.UvicornWorker'
+# 默認每個CPU核心一個worker，可通過WEB_CONCURRENCY覆蓋
+workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
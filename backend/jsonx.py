@@ -0,0 +1,20 @@
+"""JSON編解碼：優先使用orjson，未安裝時退回標準庫json"""
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    import json
+
+
+def loads(data):
+    """解析JSON字符串或字節"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj):
+    """將對象序列化為JSON字符串 (保留中文等非ASCII字符，允許非字符串鍵)"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False)
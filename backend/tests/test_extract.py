@@ -0,0 +1,128 @@
+"""合併提取參數的結果校驗，以及發送給OpenAI的價格數據精簡
+
+在backend目錄下執行 python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('QUERY_CACHE_DIR', tempfile.mkdtemp())
+
+import app  # noqa: E402
+import jsonx  # noqa: E402
+
+QUERIES = ('東京的t3.micro', '新加坡的S3', '俄勒岡的Lambda')
+
+# (說明, 模型返回的results) 均應被拒絕
+INVALID_RESULTS = (
+    ('缺少index', [{'index': 0}, {'index': 1}]),
+    ('重複index', [{'index': 0}, {'index': 1}, {'index': 1}]),
+    ('超出範圍', [{'index': 0}, {'index': 1}, {'index': 3}]),
+    ('負數index', [{'index': -1}, {'index': 1}, {'index': 2}]),
+    ('字符串index', [{'index': '0'}, {'index': 1}, {'index': 2}]),
+    ('浮點數index', [{'index': 0.0}, {'index': 1}, {'index': 2}]),
+    ('布爾值index', [{'index': False}, {'index': True}, {'index': 2}]),
+    ('沒有index', [{'service': 'ec2'}, {'index': 1}, {'index': 2}]),
+    ('結果過多', [{'index': 0}, {'index': 1}, {'index': 2}, {'index': 3}]),
+)
+
+
+def _completion(results):
+    """構造函數調用形式的OpenAI回應"""
+    arguments = jsonx.dumps({'results': results})
+    message = SimpleNamespace(function_call=SimpleNamespace(arguments=arguments))
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _patch_create(results):
+    return mock.patch.object(
+        app.openai_client.chat.completions, 'create',
+        mock.AsyncMock(return_value=_completion(results)))
+
+
+class ExtractManyTest(unittest.TestCase):
+    def test_orders_results_by_index(self):
+        results = [{'index': i, 'service': str(i)} for i in (2, 0, 1)]
+        with _patch_create(results):
+            ordered = asyncio.run(app._extract_many(list(QUERIES)))
+        self.assertEqual(ordered, [{'service': '0'}, {'service': '1'}, {'service': '2'}])
+
+    def test_rejects_invalid_indices(self):
+        for name, results in INVALID_RESULTS:
+            with self.subTest(name), _patch_create(results):
+                with self.assertRaises(ValueError):
+                    asyncio.run(app._extract_many(list(QUERIES)))
+
+    def test_falls_back_to_single_queries(self):
+        async def extract_single(query):
+            return {'query': query}
+
+        async def resolve():
+            loop = asyncio.get_running_loop()
+            batch = [(query, loop.create_future()) for query in QUERIES]
+            await app._resolve_extract_batch(batch)
+            return [future.result() for _, future in batch]
+
+        for name, results in INVALID_RESULTS:
+            with self.subTest(name), _patch_create(results), \
+                    mock.patch.object(app, '_extract_single', extract_single):
+                self.assertEqual(asyncio.run(resolve()),
+                                 [{'query': query} for query in QUERIES])
+
+
+def _ec2_row(instance_type, price, operating_system='Linux'):
+    return {
+        'instanceType': instance_type,
+        'operatingSystem': operating_system,
+        'region': 'Asia Pacific (Tokyo)',
+        'onDemandPrice': price,
+        'unit': 'USD per Hour',
+    }
+
+
+class CompactPricingDataTest(unittest.TestCase):
+    def test_passes_through_non_lists(self):
+        for data in ([], None, {'error': 'x'}, 'text'):
+            with self.subTest(data=data):
+                self.assertEqual(app._compact_pricing_data(data), data)
+
+    def test_union_of_columns(self):
+        data = [
+            {'storageClass': 'Standard', 'pricePerGB': '0.025'},
+            {'storageClass': 'Standard', 'pricePerGB': '0.024', 'estimatedCost': '2.4'},
+            {'storageClass': 'Standard', 'requestType': 'PUT'},
+        ]
+        self.assertEqual(app._compact_pricing_data(data), {
+            'cols': ['storageClass', 'pricePerGB', 'estimatedCost', 'requestType'],
+            'rows': [
+                ['Standard', '0.025', None, None],
+                ['Standard', '0.024', '2.4', None],
+                ['Standard', None, None, 'PUT'],
+            ],
+        })
+
+    def test_keeps_cheapest_ec2_row(self):
+        # 同一實例類型的多條記錄 (如不同租用方式或容量預留)，零價格視為無效
+        data = [_ec2_row('t3.micro', price) for price in ('0.0000', '0.0136', '0.0200')]
+        data += [_ec2_row(f'm5.{size}', '0.1') for size in range(8)]
+        data.append(_ec2_row('t3.micro', '0.0250', 'Windows'))
+        compact = app._compact_pricing_data(data)
+        rows = [dict(zip(compact['cols'], row)) for row in compact['rows']]
+        self.assertEqual(len(rows), 10)
+        self.assertIn(_ec2_row('t3.micro', '0.0136'), rows)
+        self.assertIn(_ec2_row('t3.micro', '0.0250', 'Windows'), rows)
+
+    def test_small_ec2_results_unchanged(self):
+        data = [_ec2_row('t3.micro', price) for price in ('0.0136', '0.0200')]
+        compact = app._compact_pricing_data(data)
+        self.assertEqual(compact['rows'], [list(row.values()) for row in data])
+
+
+if __name__ == '__main__':
+    unittest.main()
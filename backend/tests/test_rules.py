@@ -0,0 +1,143 @@
+"""關鍵詞規則表的回歸檢查：規則順序調整後，原有的輸入仍須得到相同的標準值，
+地區別名須解析到正確的地區代碼
+
+在backend目錄下執行 python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+os.environ.setdefault('QUERY_CACHE_DIR', tempfile.mkdtemp())
+
+import app  # noqa: E402
+
+# (輸入, 原if/elif鏈的結果)，輸入已轉為小寫
+OS_CASES = (
+    ('linux', 'Linux'),
+    ('amazon linux 2', 'Linux'),
+    ('windows', 'Windows'),
+    ('windows server 2019', 'Windows'),
+)
+S3_CASES = (
+    ('標準', 'Standard'),
+    ('standard', 'Standard'),
+    ('智能分層', 'Intelligent-Tiering'),
+    ('intelligent-tiering', 'Intelligent-Tiering'),
+    ('冷藏', 'Glacier'),
+    ('glacier', 'Glacier'),
+    ('深度歸檔', 'Glacier Deep Archive'),
+    ('deep archive', 'Glacier Deep Archive'),
+    ('單區域', 'One Zone'),
+    ('one zone', 'One Zone'),
+    ('one zone - infrequent access', 'One Zone'),
+    ('infrequent access', 'Standard - Infrequent Access'),
+)
+# 有意改變的結果：原實現先匹配較寬泛的關鍵詞
+S3_CHANGED_CASES = (
+    ('standard - infrequent access', 'Standard - Infrequent Access'),
+    ('標準-不頻繁', 'Standard - Infrequent Access'),
+    ('glacier deep archive', 'Glacier Deep Archive'),
+)
+DB_CASES = (
+    ('mysql', 'MySQL'),
+    ('postgresql', 'PostgreSQL'),
+    ('postgres', 'PostgreSQL'),
+    ('oracle', 'Oracle'),
+    ('sqlserver', 'SQL Server'),
+    ('sql server', 'SQL Server'),
+    ('mariadb', 'MariaDB'),
+)
+
+# (用戶輸入的地區, 地區代碼)，查詢時先轉為小寫再匹配
+REGION_CASES = (
+    ('維吉尼亞', 'us-east-1'),
+    ('维吉尼亚', 'us-east-1'),
+    ('N. Virginia', 'us-east-1'),
+    ('美國東部', 'us-east-1'),
+    ('美国', 'us-east-1'),
+    ('美國加州', 'us-west-1'),
+    ('US West (N. California)', 'us-west-1'),
+    ('US West (Oregon)', 'us-west-2'),
+    ('台灣', 'ap-east-2'),
+    ('臺灣', 'ap-east-2'),
+    ('Taiwan', 'ap-east-2'),
+    ('日本', 'ap-northeast-1'),
+    ('Japan', 'ap-northeast-1'),
+    ('日本大阪', 'ap-northeast-3'),
+    ('Osaka, Japan', 'ap-northeast-3'),
+    ('韓國', 'ap-northeast-2'),
+    ('韩国', 'ap-northeast-2'),
+    ('South Korea', 'ap-northeast-2'),
+    ('印度', 'ap-south-1'),
+    ('India', 'ap-south-1'),
+    ('印度海德拉巴', 'ap-south-2'),
+    ('印尼', 'ap-southeast-3'),
+    ('印度尼西亚', 'ap-southeast-3'),
+    ('Indonesia', 'ap-southeast-3'),
+    ('澳洲', 'ap-southeast-2'),
+    ('澳大利亚', 'ap-southeast-2'),
+    ('Australia', 'ap-southeast-2'),
+    ('澳洲墨爾本', 'ap-southeast-4'),
+    ('马来西亚', 'ap-southeast-5'),
+    ('泰国', 'ap-southeast-7'),
+    ('德國', 'eu-central-1'),
+    ('德国', 'eu-central-1'),
+    ('Germany', 'eu-central-1'),
+    ('瑞士', 'eu-central-2'),
+    ('英國', 'eu-west-2'),
+    ('United Kingdom', 'eu-west-2'),
+    ('法国', 'eu-west-3'),
+    ('義大利', 'eu-south-1'),
+    ('意大利', 'eu-south-1'),
+    ('瑞典', 'eu-north-1'),
+    ('愛爾蘭', 'eu-west-1'),
+    ('南非', 'af-south-1'),
+    ('以色列', 'il-central-1'),
+    ('特拉维夫', 'il-central-1'),
+    ('巴林', 'me-south-1'),
+    ('迪拜', 'me-central-1'),
+    ('阿联酋', 'me-central-1'),
+    ('卡尔加里', 'ca-west-1'),
+    ('蒙特利尔', 'ca-central-1'),
+    ('加拿大', 'ca-central-1'),
+    ('加拿大西部', 'ca-west-1'),
+    ('巴西', 'sa-east-1'),
+    ('Brazil', 'sa-east-1'),
+    ('São Paulo', 'sa-east-1'),
+)
+
+
+class RuleTableTest(unittest.TestCase):
+    def check(self, rules, cases, default):
+        for text, expected in cases:
+            with self.subTest(text=text):
+                self.assertEqual(app._match_rule(rules, text, default), expected)
+
+    def test_os_rules(self):
+        self.check(app._OS_RULES, OS_CASES, None)
+        self.assertEqual(app._match_rule(app._OS_RULES, 'rhel', 'RHEL'), 'RHEL')
+
+    def test_s3_rules(self):
+        self.check(app._S3_RULES, S3_CASES + S3_CHANGED_CASES, 'Standard')
+        self.assertEqual(app._match_rule(app._S3_RULES, 'unknown', 'Standard'), 'Standard')
+
+    def test_region_aliases(self):
+        cases = tuple((text.lower(), code) for text, code in REGION_CASES)
+        self.check(app._REGION_ALIAS_RULES, cases, None)
+        self.assertIsNone(app._match_rule(app._REGION_ALIAS_RULES, '火星', None))
+
+    def test_region_alias_table(self):
+        _, priority = app._REGION_ALIAS_RULES
+        codes = {code for _, code in priority.values()}
+        self.assertLessEqual(codes, set(app.REGION_MAPPING))
+
+    def test_db_rules(self):
+        self.check(app._DB_RULES, DB_CASES, 'MySQL')
+        self.assertEqual(app._match_rule(app._DB_RULES, 'unknown', 'MySQL'), 'MySQL')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,7 +12,6 @@ import {
   Divider,
   Alert
 } from '@mui/material';
-import axios from 'axios';
 import './App.css';
 
 // API 基礎URL
@@ -38,6 +37,40 @@ interface QueryResult {
   response: string;
 }
 
+// 讀取Server-Sent Events流，每收到一條完整事件就回調一次
+async function readEventStream(
+  response: Response,
+  onEvent: (event: string, data: any) => void
+) {
+  const reader = response.body!.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      for (const line of rawEvent.split('\n')) {
+        if (line.startsWith('event: ')) {
+          event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+          data += line.slice(6);
+        }
+      }
+      onEvent(event, data ? JSON.parse(data) : null);
+      boundary = buffer.indexOf('\n\n');
+    }
+  }
+}
+
 function App() {
   const [query, setQuery] = useState('');
   const [loading, setLoading] = useState(false);
@@ -60,19 +93,41 @@ function App() {
     setError(null);
     
     try {
-      const response = await axios.post(`${API_BASE_URL}/api/query`, { query });
-      setResult(response.data);
-      
-      // 檢查是否有價格數據
-      if (response.data.pricing_data && response.data.pricing_data.length === 0) {
-        setError('沒有找到符合條件的價格數據。AWS可能沒有提供該地區或配置的價格信息，或者您的查詢參數需要調整。');
+      // 使用流式接口，回應文本邊生成邊顯示
+      const response = await fetch(`${API_BASE_URL}/api/query/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query })
+      });
+
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        setError(`錯誤: ${data.error || '未知錯誤'}`);
+        setResult(null);
+        return;
       }
+
+      let current: QueryResult = { query, parameters: {}, pricing_data: [], response: '' };
+      setResult(current);
+
+      await readEventStream(response, (event, data) => {
+        if (event === 'parameters') {
+          current = { ...current, parameters: data };
+        } else if (event === 'pricing_data') {
+          current = { ...current, pricing_data: data };
+          // 檢查是否有價格數據
+          if (Array.isArray(data) && data.length === 0) {
+            setError('沒有找到符合條件的價格數據。AWS可能沒有提供該地區或配置的價格信息，或者您的查詢參數需要調整。');
+          }
+        } else if (event === 'response') {
+          current = { ...current, response: current.response + data };
+        } else if (event === 'error') {
+          setError(`錯誤: ${data.error || '未知錯誤'}`);
+        }
+        setResult(current);
+      });
     } catch (err) {
-      if (axios.isAxiosError(err) && err.response) {
-        setError(`錯誤: ${err.response.data.error || '未知錯誤'}`);
-      } else {
-        setError('無法連接到服務器，請檢查後端服務是否運行');
-      }
+      setError('無法連接到服務器，請檢查後端服務是否運行');
       setResult(null);
     } finally {
       setLoading(false);